@@ -11,7 +11,9 @@ import json
 from typing import Any, Dict
 from logcfg import setup_logging, disable_logging
 import logging
+from urllib.parse import urlsplit
 from utils import load_env, envvarsenum, get_resource_path, gen_tool_description
+from proxy import configure_proxy, get_tunnel_pool, DEFAULT_PROXY_URL
 # TOOL REGISTRY, main part of mcp
 from  tool_registry import execute_tool_call, load_tools
 
@@ -35,11 +37,20 @@ print(production_banner)
 
 ### SPECIFIC SETTINGS FOR DEVMATE
 MCP_SOCKET_URL = "wss://api.xiaozhi.me/mcp/?token=" + envvars[envvarsenum.MCP_JWT]
-PROXY_URL = "http://127.0.0.1:3128"
+PROXY_URL = envvars[envvarsenum.PROXY_URL] or DEFAULT_PROXY_URL
 NAMESPACE     = ""
 INITIAL_DELAY = 1    # seconds
 MAX_DELAY     = 60   # seconds
 PROTOCOL_VERSION = "2024-11-05"
+TUNNEL_WARM_LEAD = 2 # seconds before a delayed retry to open the MCP tunnel
+
+# Warm one tunnel for the first connect; later ones are warmed by the retry
+# loop only before a delayed retry, an idle tunnel would not outlive a session
+_mcp_target = urlsplit(MCP_SOCKET_URL)
+MCP_HOST = _mcp_target.hostname
+MCP_PORT = _mcp_target.port or (443 if _mcp_target.scheme == "wss" else 80)
+configure_proxy(PROXY_URL if envvars[envvarsenum.PROXYENABLE] else None,
+                warm_targets=[(MCP_HOST, MCP_PORT)])
 
 # ───────────────────────────────────────────────────────────────────────────
 # PROTOCOL METADATA & HANDLERS (do not edit unless protocol changes)
@@ -74,16 +85,21 @@ auth_success = False
 
 async def create_websocket_connection():
     """Create a WebSocket connection with optional proxy support."""
-    
-    # For WebSocket connections, we'll handle the connection directly
-    if envvars[envvarsenum.PROXYENABLE]:
-        print("[mcp] Using proxy:", PROXY_URL)
-        # Note: websockets library doesn't directly support HTTP proxies
-        # You might need to use a different approach or library for proxy support
+    kwargs = {"ping_interval": 20, "ping_timeout": 10}
+    tunnel_pool = get_tunnel_pool()
+    if tunnel_pool is not None:
+        print(f"[mcp] Using proxy: {tunnel_pool.proxy_host}:{tunnel_pool.proxy_port}")
+        loop = asyncio.get_running_loop()
+        kwargs["sock"] = await loop.run_in_executor(None, tunnel_pool.acquire, MCP_HOST, MCP_PORT)
     else:
         print("[mcp] Connecting directly (no proxy)")
-    
-    return None  # We'll handle connection in connect_with_infinite_retry
+
+    try:
+        return await websockets.connect(MCP_SOCKET_URL, **kwargs)
+    except BaseException:
+        if "sock" in kwargs:
+            kwargs["sock"].close()
+        raise
 
 async def handle_websocket_messages(ws):
     """Handle incoming WebSocket messages and process MCP requests."""
@@ -165,13 +181,15 @@ async def connect_with_infinite_retry(is_reconnect: bool = False):
             print(f"[mcp] Connecting to {MCP_SOCKET_URL} (attempt {attempt}) …")
             
             # Connect to WebSocket (token is already in the URL)
-            websocket = await websockets.connect(
-                MCP_SOCKET_URL,
-                ping_interval=20,
-                ping_timeout=10
-            )
+            websocket = await create_websocket_connection()
 
             print("[mcp] WebSocket connected successfully")
+            tunnel_pool = get_tunnel_pool()
+            if tunnel_pool is not None:
+                stats = tunnel_pool.stats(MCP_HOST, MCP_PORT)
+                logger.info(f"[mcp] MCP proxy tunnels: {stats['setup_count']} opened "
+                            f"(avg {stats['setup_avg'] * 1000:.1f} ms, max {stats['setup_max'] * 1000:.1f} ms), "
+                            f"{stats['reused']} reused, {stats['idle']} idle")
             
             # Handle messages in the WebSocket
             await handle_websocket_messages(websocket)
@@ -192,7 +210,14 @@ async def connect_with_infinite_retry(is_reconnect: bool = False):
             jitter = random.uniform(0.8, 1.2)
             wait = delay * jitter
             print(f"[mcp] Retrying in {wait:.1f}s …")
-            await asyncio.sleep(wait)
+            tunnel_pool = get_tunnel_pool()
+            if tunnel_pool is not None and wait > TUNNEL_WARM_LEAD:
+                # Open the tunnel during the backoff so the retry skips the CONNECT
+                await asyncio.sleep(wait - TUNNEL_WARM_LEAD)
+                tunnel_pool.keep_warm(MCP_HOST, MCP_PORT)
+                await asyncio.sleep(TUNNEL_WARM_LEAD)
+            else:
+                await asyncio.sleep(wait)
 
         delay = min(delay * 2, MAX_DELAY) if delay > 0 else 0
         attempt += 1
@@ -0,0 +1,326 @@
+import base64
+import logging
+import select
+import socket
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger("Proxy")
+
+DEFAULT_PROXY_URL = "http://127.0.0.1:3128"
+CONNECT_TIMEOUT = 10    # seconds
+MAX_IDLE_TUNNELS = 4    # across all targets
+IDLE_TUNNEL_TTL = 30    # seconds, servers drop tunnels that never start talking
+
+Target = Tuple[str, int]
+
+
+class ProxyTunnelError(OSError):
+    """Raised when the proxy refuses or fails a CONNECT request."""
+
+
+class TunnelPool:
+    """Pool of warm HTTP CONNECT tunnels through a single proxy.
+
+    Tunnels are keyed by target (host, port). ``acquire`` hands out an idle
+    tunnel when one is still alive, otherwise it opens a new one and records
+    the setup latency for that target. Idle tunnels only exist for targets
+    someone asked to ``warm`` (or ``keep_warm`` in the background); expired
+    or dead ones are swept on every acquire and release.
+    """
+
+    def __init__(self, proxy_url: str = DEFAULT_PROXY_URL, max_idle: int = MAX_IDLE_TUNNELS,
+                 idle_ttl: float = IDLE_TUNNEL_TTL, connect_timeout: float = CONNECT_TIMEOUT):
+        parts = urlsplit(proxy_url)
+        if parts.scheme != "http" or not parts.hostname or parts.port is None:
+            # Never echo proxy_url, it may carry user:pass
+            raise ValueError("Unsupported proxy URL, expected http://[user:pass@]host:port")
+        self.proxy_host = parts.hostname
+        self.proxy_port = parts.port
+        self.proxy_auth = None
+        if parts.username is not None:
+            credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+            self.proxy_auth = "Basic " + base64.b64encode(credentials.encode()).decode()
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+        self.connect_timeout = connect_timeout
+        self._idle: Dict[Target, List[Tuple[socket.socket, float]]] = {}
+        self._idle_count = 0
+        self._refilling = set()
+        self._closed = False
+        self._lock = threading.Lock()
+        # Per target: setup count, total, max and last latency, reuse count
+        self._stats: Dict[Target, Dict[str, float]] = {}
+
+    def _target_stats(self, key: Target) -> Dict[str, float]:
+        if key not in self._stats:
+            self._stats[key] = {"setup_count": 0, "setup_total": 0.0, "setup_max": 0.0,
+                                "setup_last": 0.0, "reused": 0}
+        return self._stats[key]
+
+    def open_tunnel(self, host: str, port: int, timeout: Optional[float] = None) -> socket.socket:
+        """Open a new CONNECT tunnel to host:port and return the connected socket."""
+        timeout = self.connect_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        sock = socket.create_connection((self.proxy_host, self.proxy_port), timeout=timeout)
+        try:
+            target = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+            request = f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n"
+            if self.proxy_auth:
+                request += f"Proxy-Authorization: {self.proxy_auth}\r\n"
+            request += "\r\n"
+            sock.sendall(request.encode("latin-1"))
+            status = self._read_connect_response(sock)
+        except BaseException:
+            sock.close()
+            raise
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            stats = self._target_stats((host, port))
+            stats["setup_count"] += 1
+            stats["setup_total"] += elapsed
+            stats["setup_last"] = elapsed
+            stats["setup_max"] = max(stats["setup_max"], elapsed)
+        logger.debug(f"[proxy] CONNECT {target} → {status} in {elapsed * 1000:.1f} ms")
+        return sock
+
+    @staticmethod
+    def _read_connect_response(sock: socket.socket) -> str:
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ProxyTunnelError("Proxy closed the connection during CONNECT")
+            data += chunk
+            if len(data) > 65536:
+                raise ProxyTunnelError("Proxy CONNECT response headers too large")
+        head, _, rest = data.partition(b"\r\n\r\n")
+        status_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+        fields = status_line.split(" ", 2)
+        if len(fields) < 2 or not fields[0].startswith("HTTP/") or not fields[1].isdigit():
+            raise ProxyTunnelError(f"Malformed proxy response: {status_line!r}")
+        if not fields[1].startswith("2"):
+            raise ProxyTunnelError(f"Proxy refused CONNECT: {status_line}")
+        if rest:
+            raise ProxyTunnelError("Proxy sent unexpected data after CONNECT response")
+        return status_line
+
+    @staticmethod
+    def _is_alive(sock: socket.socket) -> bool:
+        # An idle tunnel must be silent; readable means EOF or stray bytes.
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _sweep(self, now: float) -> List[socket.socket]:
+        # Caller holds the lock; returns the expired or dead tunnels to close.
+        stale = []
+        for key in list(self._idle):
+            fresh = []
+            for sock, since in self._idle[key]:
+                if now - since <= self.idle_ttl and self._is_alive(sock):
+                    fresh.append((sock, since))
+                else:
+                    stale.append(sock)
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+        self._idle_count -= len(stale)
+        return stale
+
+    def acquire(self, host: str, port: int, timeout: Optional[float] = None) -> socket.socket:
+        """Return a warm tunnel to host:port, opening a new one if none is idle."""
+        key = (host, port)
+        sock = None
+        with self._lock:
+            stale = self._sweep(time.monotonic())
+            idle = self._idle.get(key)
+            if idle:
+                sock, _ = idle.pop()
+                self._idle_count -= 1
+                if not idle:
+                    del self._idle[key]
+                self._target_stats(key)["reused"] += 1
+        for s in stale:
+            s.close()
+        if sock is not None:
+            sock.settimeout(self.connect_timeout if timeout is None else timeout)
+            return sock
+        return self.open_tunnel(host, port, timeout)
+
+    def release(self, host: str, port: int, sock: socket.socket):
+        """Hand back an unused tunnel so the next ``acquire`` can skip the CONNECT."""
+        with self._lock:
+            now = time.monotonic()
+            stale = self._sweep(now)
+            keep = not self._closed and self._idle_count < self.max_idle
+            if keep:
+                self._idle.setdefault((host, port), []).append((sock, now))
+                self._idle_count += 1
+        for s in stale:
+            s.close()
+        if not keep:
+            sock.close()
+
+    def keep_warm(self, host: str, port: int):
+        """Open one idle tunnel to host:port in a background thread."""
+        key = (host, port)
+        with self._lock:
+            if self._closed or key in self._refilling:
+                return
+            self._refilling.add(key)
+
+        def refill():
+            try:
+                self.warm(host, port)
+            finally:
+                with self._lock:
+                    self._refilling.discard(key)
+
+        threading.Thread(target=refill, name=f"tunnel-warm-{host}:{port}", daemon=True).start()
+
+    def warm(self, host: str, port: int, count: int = 1):
+        """Open up to ``count`` idle tunnels to host:port ahead of the next acquire."""
+        with self._lock:
+            missing = count - len(self._idle.get((host, port), []))
+        for _ in range(missing):
+            try:
+                self.release(host, port, self.open_tunnel(host, port))
+            except OSError as e:
+                logger.warning(f"[proxy] Failed to warm tunnel to {host}:{port}: {e}")
+                break
+
+    def stats(self, host: Optional[str] = None, port: Optional[int] = None) -> Dict[str, float]:
+        """Return tunnel setup latency (seconds) and reuse counters.
+
+        With host and port, only tunnels to that target are counted.
+        """
+        with self._lock:
+            if host is not None:
+                targets = [self._target_stats((host, port))]
+                idle = len(self._idle.get((host, port), []))
+            else:
+                targets = list(self._stats.values())
+                idle = self._idle_count
+            count = sum(t["setup_count"] for t in targets)
+            return {
+                "setup_count": count,
+                "setup_avg": sum(t["setup_total"] for t in targets) / count if count else 0.0,
+                "setup_max": max((t["setup_max"] for t in targets), default=0.0),
+                "setup_last": targets[0]["setup_last"] if len(targets) == 1 else 0.0,
+                "reused": sum(t["reused"] for t in targets),
+                "idle": idle,
+            }
+
+    def close(self):
+        """Close every idle tunnel and stop warming targets."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, {}
+            self._idle_count = 0
+        for tunnels in idle.values():
+            for sock, _ in tunnels:
+                sock.close()
+
+
+# ───────────────────────────────────────────────────────────────────────────
+# requests integration: urllib3 connections whose socket is a pooled tunnel.
+# urllib3 keeps the connection alive between requests, so the tunnel is
+# reused for as long as the target keeps the HTTP connection open.
+# ───────────────────────────────────────────────────────────────────────────
+
+class _TunnelConnectionMixin:
+    tunnel_pool: TunnelPool = None  # type: ignore
+
+    def _new_conn(self) -> socket.socket:
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) else None
+        return self.tunnel_pool.acquire(self.host, self.port, timeout)
+
+
+class TunnelAdapter(HTTPAdapter):
+    """requests adapter that sends every connection through a TunnelPool."""
+
+    def __init__(self, tunnel_pool: TunnelPool, **kwargs):
+        self.tunnel_pool = tunnel_pool
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attrs = {"tunnel_pool": self.tunnel_pool}
+        http_conn = type("TunnelHTTPConnection", (_TunnelConnectionMixin, HTTPConnection), attrs)
+        https_conn = type("TunnelHTTPSConnection", (_TunnelConnectionMixin, HTTPSConnection), attrs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("TunnelHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": http_conn}),
+            "https": type("TunnelHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": https_conn}),
+        }
+
+    def __setstate__(self, state):
+        # The pool holds live sockets and is never pickled; reattach to the shared one.
+        self.tunnel_pool = _tunnel_pool
+        super().__setstate__(state)
+
+
+# ───────────────────────────────────────────────────────────────────────────
+# Shared state used by main.py and the tools
+# ───────────────────────────────────────────────────────────────────────────
+
+_tunnel_pool: Optional[TunnelPool] = None
+_http_session: Optional[requests.Session] = None
+
+
+def configure_proxy(proxy_url: Optional[str], warm_targets: Iterable[Target] = ()):
+    """Route websocket and tool traffic through proxy_url, or go direct when None.
+
+    Tunnels to every (host, port) in warm_targets are opened in the background.
+    """
+    global _tunnel_pool, _http_session
+    if _http_session is not None:
+        _http_session.close()
+        _http_session = None
+    if _tunnel_pool is not None:
+        _tunnel_pool.close()
+    _tunnel_pool = TunnelPool(proxy_url) if proxy_url else None
+    if _tunnel_pool is not None:
+        for host, port in warm_targets:
+            _tunnel_pool.keep_warm(host, port)
+
+
+def get_tunnel_pool() -> Optional[TunnelPool]:
+    return _tunnel_pool
+
+
+def get_http_session() -> requests.Session:
+    """Shared requests session for tools, proxied when configure_proxy was called."""
+    global _http_session
+    if _http_session is None:
+        session = requests.Session()
+        if _tunnel_pool is not None:
+            # Ignore HTTP(S)_PROXY from the environment, the adapter already tunnels.
+            session.trust_env = False
+            adapter = TunnelAdapter(_tunnel_pool)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        _http_session = session
+    return _http_session
+
+
+if __name__ == "__main__":
+    # Example usage: python proxy.py [proxy_url] [url]
+    import sys
+    logging.basicConfig(level=logging.DEBUG)
+    configure_proxy(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PROXY_URL)
+    url = sys.argv[2] if len(sys.argv) > 2 else "http://ip-api.com/json/"
+    for _ in range(3):
+        res = get_http_session().get(url, timeout=10)
+        print(res.status_code, len(res.content))
+    print(get_tunnel_pool().stats())
@@ -1,4 +1,4 @@
-import requests
+from proxy import get_http_session
 from typing import Any, Dict, List
 
 def get_my_ipaddress_info_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
@@ -19,5 +19,5 @@ def get_my_ipaddress_info_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
     }
     """
     url = "http://ip-api.com/json/"
-    res = requests.get(url)
+    res = get_http_session().get(url)
     return {"content" : [{"type" : "text", "text" : f"[Result] {res.json()}"}]}
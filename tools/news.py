@@ -1,4 +1,4 @@
-import requests
+from proxy import get_http_session
 from typing import Any, Dict, List, Optional
 from response_format import *
 import xml.etree.ElementTree as ET
@@ -134,7 +134,7 @@ def get_latest_news_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
     """
     url = arguments.get("url", "https://vnexpress.net/rss/tin-moi-nhat.rss")
     try:
-        res = requests.get(url, timeout=10)
+        res = get_http_session().get(url, timeout=10)
         res.raise_for_status()
     except Exception as e:
         return return_error_response(f"Failed to fetch RSS feed: {e}")
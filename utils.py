@@ -9,6 +9,7 @@ import json
 class envvarsenum:
     MCP_JWT = "MCP_JWT"
     PROXYENABLE = "PROXYENABLE"
+    PROXY_URL = "PROXY_URL"
     CMC_API_KEY = "COIN_MARKETCAP_API_KEY"
 
 def get_resource_path(relative_path: str) -> str:
@@ -94,6 +95,7 @@ def load_env():
     envvars = {
         envvarsenum.MCP_JWT            : os.getenv("MCP_JWT", ""),
         envvarsenum.PROXYENABLE        : os.getenv("PROXYENABLE", "false").lower() == "true",
+        envvarsenum.PROXY_URL          : os.getenv("PROXY_URL", ""),
         envvarsenum.CMC_API_KEY        : os.getenv("COIN_MARKETCAP_API_KEY", "")
     }
     return envvars